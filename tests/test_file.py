@@ -1,12 +1,16 @@
 import os
+import tempfile
 import unittest
+import zipfile
 from datetime import datetime, timezone
 from pathlib import Path
+from unittest import mock
 
 import ukis_pysat.file as psf
 
 path_testfiles = Path(__file__).parents[0] / "testfiles"
-str_path = os.path.join(os.path.dirname(__file__), "testfiles")
+str_path = str(path_testfiles)
+str_manifest_bad = str(path_testfiles.joinpath("manifest_bad.safe"))
 
 
 class FileTest(unittest.TestCase):
@@ -14,10 +18,9 @@ class FileTest(unittest.TestCase):
         with self.assertRaises(KeyError, msg=f"No environment variable Key found"):
             psf.env_get("Key")
 
-        os.environ["FUN"] = "True"
-        self.assertTrue(psf.env_get("FUN", boolean=True))
-        os.environ["ISITWEEKENDYET"] = "0"
-        self.assertFalse(psf.env_get("ISITWEEKENDYET", boolean=True))
+        with mock.patch.dict(os.environ, {"FUN": "True", "ISITWEEKENDYET": "0"}):
+            self.assertTrue(psf.env_get("FUN", boolean=True))
+            self.assertFalse(psf.env_get("ISITWEEKENDYET", boolean=True))
 
     def test_get_sentinel_scene_from_path_testfiles(self):
         with psf.get_sentinel_scene_from_dir(path_testfiles) as (full_path, ident):
@@ -31,6 +34,25 @@ class FileTest(unittest.TestCase):
         with psf.get_sentinel_scene_from_dir(path_testfiles.joinpath("another_scene")) as (full_path, ident):
             self.assertEqual("S2__IN_FOLDER", ident)
 
+    def test_extract_zip(self):
+        members = {
+            "S1M_scene/manifest.safe": b"manifest",
+            "S1M_scene/annotation/a.xml": b"a" * 10000,
+            "S1M_scene/b": b"",
+        }
+        with tempfile.TemporaryDirectory() as td:
+            zip_path = os.path.join(td, "S1M_scene.zip")
+            with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+                z.writestr("S1M_scene/empty_dir/", b"")
+                for name, content in members.items():
+                    z.writestr(name, content)
+
+            psf._extract_zip(zip_path, os.path.join(td, "out"), max_workers=2)
+
+            self.assertTrue(Path(td, "out", "S1M_scene", "empty_dir").is_dir())
+            for name, content in members.items():
+                self.assertEqual(Path(td, "out", name).read_bytes(), content)
+
     def test_get_polarization_from_s1_filename_SDH(self):
         self.assertEqual(
             psf.get_polarization_from_s1_filename(
@@ -86,6 +108,10 @@ class FileTest(unittest.TestCase):
             ),
             datetime(2020, 1, 13, 0, 22, 19, tzinfo=timezone.utc),
         )
+        with self.assertRaises(ValueError):
+            psf.get_ts_from_sentinel_filename(
+                "S2AM_MSIXXX_20210229T002219_Nxxyy_ROOO_Txxxxx_<Product Discriminator>.SAFE"
+            )
 
     def test_get_ts_from_sentinel_filename_S3(self):
         self.assertEqual(
@@ -101,6 +127,31 @@ class FileTest(unittest.TestCase):
             datetime(2020, 1, 13, 0, 22, 19, tzinfo=timezone.utc),
         )
 
+    def test_get_ts_from_sentinel_filenames(self):
+        filenames = [
+            "S1M_BB_TTTR_LFPP_20200113T074619_20200113T074644_OOOOOO_DDDDDD_CCCC.SAFE.zip",
+            "S2AM_MSIXXX_20200229T002219_Nxxyy_ROOO_Txxxxx_<Product Discriminator>.SAFE",
+            "S3M_OL_L_TTT____20201231T235959_20210101T000029_YYYYMMDDTHHMMSS_i_GGG_c.SEN3",
+        ]
+        for start_date in (True, False):
+            with self.subTest(start_date=start_date):
+                self.assertEqual(
+                    psf.get_ts_from_sentinel_filenames(filenames, start_date).astype(datetime).tolist(),
+                    [psf.get_ts_from_sentinel_filename(f, start_date).replace(tzinfo=None) for f in filenames],
+                )
+        self.assertEqual(psf.get_ts_from_sentinel_filenames([]).size, 0)
+
+        for filename in (
+            "S2AM_MSIXXX_20210229T002219_Nxxyy_ROOO_Txxxxx_<Product Discriminator>.SAFE",
+            "S2AM_MSIXXX_2020022XT002219_Nxxyy_ROOO_Txxxxx_<Product Discriminator>.SAFE",
+            "S2AM_MSIXXX_20200229T00221_Nxxyy_ROOO_Txxxxx_<Product Discriminator>.SAFE",
+            "S2AM_MSIXXX_00000113T002219_Nxxyy_ROOO_Txxxxx_<Product Discriminator>.SAFE",
+            "S2A_MSI_2020",
+            "S3A_short",
+        ):
+            with self.subTest(filename=filename), self.assertRaises(ValueError):
+                psf.get_ts_from_sentinel_filenames([filename])
+
     def test_get_ESA_date_from_datetime(self):
         self.assertEqual(
             psf.get_sat_ts_from_datetime(datetime(2020, 1, 13, 7, 46, 19, tzinfo=timezone.utc)), "20200113T074619"
@@ -113,7 +164,29 @@ class FileTest(unittest.TestCase):
             "-25.668921, 149.766922 -24.439564))",
         )
         with self.assertRaises(KeyError, msg="Footprint not found"):
-            psf.get_footprint_from_manifest(os.path.join(path_testfiles, "manifest_bad.safe"))
+            psf.get_footprint_from_manifest(str_manifest_bad)
+
+    def test_get_footprint_wkt_from_manifest(self):
+        self.assertEqual(
+            psf.get_footprint_wkt_from_manifest(path_testfiles.joinpath("manifest.safe")),
+            "POLYGON ((149.766922 -24.439564, 153.728622 -23.51771, 154.075058 -24.737713, 150.077042 "
+            "-25.668921, 149.766922 -24.439564))",
+        )
+        with self.assertRaises(KeyError, msg="Footprint not found"):
+            psf.get_footprint_wkt_from_manifest(str_manifest_bad)
+
+        with tempfile.TemporaryDirectory() as td:
+            manifest = Path(td).joinpath("manifest.safe")
+            manifest.write_text(
+                path_testfiles.joinpath("manifest.safe")
+                .read_text()
+                .replace("-24.439564,149.766922 -23.517710", "-0.0000001,0.00001 -0.0,153.728622 -23.517710")
+            )
+            self.assertEqual(
+                psf.get_footprint_wkt_from_manifest(manifest),
+                "POLYGON ((0.00001 -0.0000001, 153.728622 0, 153.728622 -23.51771, 154.075058 -24.737713, "
+                "150.077042 -25.668921, 0.00001 -0.0000001))",
+            )
 
     def test_get_origin_from_manifest(self):
         self.assertEqual(
@@ -121,7 +194,17 @@ class FileTest(unittest.TestCase):
             "United Kingdom",
         )
         with self.assertRaises(KeyError, msg="Country of origin not found."):
-            psf.get_footprint_from_manifest(os.path.join(path_testfiles, "manifest_bad.safe"))
+            psf.get_origin_from_manifest(str_manifest_bad)
+
+    def test_get_origin_from_modified_manifest(self):
+        with tempfile.TemporaryDirectory() as td:
+            manifest = Path(td).joinpath("manifest.safe")
+            manifest.write_text(path_testfiles.joinpath("manifest.safe").read_text())
+            self.assertEqual(psf.get_origin_from_manifest(manifest), "United Kingdom")
+
+            # cached lookups are keyed on modification time and size, a rewritten file is parsed again
+            manifest.write_text(manifest.read_text().replace('country="United Kingdom"', 'country="Germany"'))
+            self.assertEqual(psf.get_origin_from_manifest(manifest), "Germany")
 
     def test_get_ipf_from_manifest(self):
         self.assertEqual(
@@ -129,7 +212,7 @@ class FileTest(unittest.TestCase):
             2.82,
         )
         with self.assertRaises(KeyError, msg="IPF Version not found."):
-            psf.get_footprint_from_manifest(os.path.join(path_testfiles, "manifest_bad.safe"))
+            psf.get_ipf_from_manifest(str_manifest_bad)
 
     def test_get_pixel_spacing(self):
         self.assertEqual(psf.get_pixel_spacing(path_testfiles), (40.0, 0.0003593261136478086))
@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
-import os
+import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
-import dask.array
+import dask
 import numpy as np
 from rasterio import windows
 from rasterio.coords import BoundingBox
+from rasterio.io import MemoryFile
 from rasterio.transform import from_bounds
 from shapely.geometry import box
 
@@ -14,17 +16,36 @@ from ukis_pysat.members import Platform
 from ukis_pysat.raster import Image
 
 TEST_FILE = Path(__file__).parents[0] / "testfiles" / "dummy.tif"
+MASK_BBOX = (11.9027457562112939, 51.4664152338322580, 11.9477435281016131, 51.5009522690838750)
+MASK_POLYGON = box(*MASK_BBOX)
 
 
 class RasterTest(unittest.TestCase):
-    def setUp(self):
-        self.img = Image(TEST_FILE)
-
-    def tearDown(self):
-        self.img.close()
+    @classmethod
+    def setUpClass(cls):
+        # shared by all tests that only read from it, tests altering the image open their own copy
+        cls.img = Image(TEST_FILE)
+        cls.test_file_bytes = TEST_FILE.read_bytes()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.img.close()
+
+    def image_copy(self, dimorder="first"):
+        """Image of TEST_FILE backed by an in-memory copy, that can be altered by the test."""
+        memfile = MemoryFile(self.test_file_bytes)
+        self.addCleanup(memfile.close)
+        img = Image(memfile, dimorder=dimorder)
+        self.addCleanup(img.close)
+        return img
 
     def test_init(self):
-        with Image(self.img.dataset) as img:
+        # Image.close() closes the dataset it wraps, so do not wrap the shared one
+        with Image(self.image_copy().dataset) as img:
+            self.assertTrue(np.array_equal(self.img.arr, img.arr))
+
+    def test_init_memoryfile(self):
+        with MemoryFile(TEST_FILE.read_bytes()) as memfile, Image(memfile) as img:
             self.assertTrue(np.array_equal(self.img.arr, img.arr))
 
     def test_context(self):
@@ -54,7 +75,9 @@ class RasterTest(unittest.TestCase):
             self.assertTrue(np.array_equal(self.img.arr, img.arr))
 
     def test_init_2dim(self):
-        with Image(np.ones(shape=(385, 502)), crs=self.img.dataset.crs, transform=self.img.dataset.transform) as img:
+        with Image(
+            np.broadcast_to(1.0, (385, 502)), crs=self.img.dataset.crs, transform=self.img.dataset.transform
+        ) as img:
             self.assertEqual(img.arr.ndim, 3)
             self.assertEqual(len(img.arr), 1)
             self.assertEqual(img.arr.shape, (1, 385, 502))
@@ -68,24 +91,14 @@ class RasterTest(unittest.TestCase):
             Image(TEST_FILE, dimorder="middle")
 
     def test_file_dimorder_first(self):
-        with Image(TEST_FILE, dimorder="first") as img_first:
-            img_first.mask(
-                box(
-                    11.9027457562112939,
-                    51.4664152338322580,
-                    11.9477435281016131,
-                    51.5009522690838750,
-                )
-            )
+        with self.image_copy(dimorder="first") as img_first:
+            img_first.mask(MASK_POLYGON)
             self.assertEqual(img_first.arr.shape, (1, 385, 502))
             self.assertEqual(
                 str(img_first.dataset.transform),
                 str(
                     from_bounds(
-                        11.9027457562112939,
-                        51.4664152338322580,
-                        11.9477435281016131,
-                        51.5009522690838750,
+                        *MASK_BBOX,
                         img_first.arr.shape[2],
                         img_first.arr.shape[1],
                     )
@@ -93,24 +106,14 @@ class RasterTest(unittest.TestCase):
             )
 
     def test_file_dimorder_last(self):
-        with Image(TEST_FILE, dimorder="last") as img_last:
-            img_last.mask(
-                box(
-                    11.9027457562112939,
-                    51.4664152338322580,
-                    11.9477435281016131,
-                    51.5009522690838750,
-                )
-            )
+        with self.image_copy(dimorder="last") as img_last:
+            img_last.mask(MASK_POLYGON)
             self.assertEqual(img_last.arr.shape, (385, 502, 1))
             self.assertEqual(
                 str(img_last.dataset.transform),
                 str(
                     from_bounds(
-                        11.9027457562112939,
-                        51.4664152338322580,
-                        11.9477435281016131,
-                        51.5009522690838750,
+                        *MASK_BBOX,
                         img_last.arr.shape[1],
                         img_last.arr.shape[0],
                     )
@@ -119,26 +122,32 @@ class RasterTest(unittest.TestCase):
 
     def test_arr_dimorder_first(self):
         with Image(
-            np.ones((1, 385, 502)), dimorder="first", crs=self.img.dataset.crs, transform=self.img.dataset.transform
+            np.broadcast_to(1.0, (1, 385, 502)),
+            dimorder="first",
+            crs=self.img.dataset.crs,
+            transform=self.img.dataset.transform,
         ) as img_first:
             self.assertEqual(img_first.arr.shape, (1, 385, 502))
 
     def test_arr_dimorder_last(self):
         with Image(
-            np.ones((385, 502, 1)), dimorder="last", crs=self.img.dataset.crs, transform=self.img.dataset.transform
+            np.broadcast_to(1.0, (385, 502, 1)),
+            dimorder="last",
+            crs=self.img.dataset.crs,
+            transform=self.img.dataset.transform,
         ) as img_last:
             self.assertEqual(img_last.arr.shape, (385, 502, 1))
 
     def test_arr_nodata(self):
-        array = np.ones((3, 385, 502))
+        array = np.broadcast_to(1.0, (3, 385, 502))  # read-only, Image does not write to it
 
         with Image(array, crs=self.img.dataset.crs, transform=self.img.dataset.transform, nodata=0.0) as img_nodata:
             self.assertEqual(img_nodata.dataset.nodata, 0.0)
             self.assertEqual(img_nodata.dataset.nodatavals, (0.0, 0.0, 0.0))
 
     def test_set_array(self):
-        with Image(TEST_FILE, dimorder="last") as im:
-            np.putmask(im.arr, im.arr > 0, 0)
+        with self.image_copy(dimorder="last") as im:
+            np.clip(im.arr, None, 0, out=im.arr)
             im.arr = im.arr + 1
 
             self.assertTrue(np.array_equal(im.arr, np.ones(shape=im.arr.shape)))
@@ -163,47 +172,37 @@ class RasterTest(unittest.TestCase):
             (11.898660522574374, 51.51158339584816, 11.900457153148748, 51.51338002642408),
         )
 
+        crs, transform = self.img.dataset.crs, from_bounds(0, 0, 10, 10, 10, 10)
+        arr = np.full((2, 10, 10), np.nan, dtype=np.float32)
+        arr[1, 2:4, 5:8] = 1
+        with Image(arr, crs=crs, transform=transform) as img:
+            self.assertEqual(img.get_valid_data_bbox(nodata=np.nan), (5.0, 6.0, 8.0, 8.0))
+            self.assertEqual(img.get_valid_data_bbox(nodata=None), (0.0, 0.0, 10.0, 10.0))
+
+        with Image(np.zeros((1, 10, 10), dtype=np.float32), crs=crs, transform=transform) as img:
+            # no valid data gives an empty window, like rasterio.windows.get_data_window
+            self.assertEqual(img.get_valid_data_bbox(), windows.bounds(windows.Window(0, 0, 0, 0), transform))
+
     def test_mask_image(self):
+        img = self.image_copy()
+
         with self.assertRaises(TypeError, msg="bbox must be of type tuple or Shapely Polygon"):
-            self.img.mask([1, 2, 3])
+            img.mask([1, 2, 3])
 
-        self.img.mask(
-            box(
-                11.9027457562112939,
-                51.4664152338322580,
-                11.9477435281016131,
-                51.5009522690838750,
-            )
-        )
-        self.assertEqual(
-            self.img.dataset.bounds,
-            BoundingBox(
-                left=11.902702941366716,
-                bottom=51.46639813686387,
-                right=11.947798368783504,
-                top=51.50098327545026,
-            ),
+        masked_bounds = BoundingBox(
+            left=11.902702941366716,
+            bottom=51.46639813686387,
+            right=11.947798368783504,
+            top=51.50098327545026,
         )
 
-        self.img.mask(
-            (
-                11.9027457562112939,
-                51.4664152338322580,
-                11.9477435281016131,
-                51.5009522690838750,
-            )
-        )
-        self.assertEqual(
-            self.img.dataset.bounds,
-            BoundingBox(
-                left=11.902702941366716,
-                bottom=51.46639813686387,
-                right=11.947798368783504,
-                top=51.50098327545026,
-            ),
-        )
+        img.mask(MASK_POLYGON)
+        self.assertEqual(img.dataset.bounds, masked_bounds)
+
+        img.mask(MASK_BBOX)
+        self.assertEqual(img.dataset.bounds, masked_bounds)
 
-        self.img.mask(
+        img.mask(
             box(
                 11.8919236802142620,
                 51.4664152338322580,
@@ -213,7 +212,7 @@ class RasterTest(unittest.TestCase):
             fill=True,
         )
         self.assertEqual(
-            self.img.dataset.bounds,
+            img.dataset.bounds,
             BoundingBox(
                 left=11.891923157920472, bottom=51.46639813686387, right=11.947798368783504, top=51.50098327545026
             ),
@@ -221,15 +220,17 @@ class RasterTest(unittest.TestCase):
 
     # @unittest.skip("Skip until we find a better test or this also runs with Github Actions")
     def test_warp(self):
-        self.img.warp("EPSG:3857")
-        self.assertEqual(self.img.dataset.meta["crs"], "EPSG:3857")
+        img = self.image_copy()
 
-        self.img.warp("EPSG:4326", resolution=1.0)
-        self.assertEqual(1.0, self.img.dataset.transform.to_gdal()[1])
+        img.warp("EPSG:3857")
+        self.assertEqual(img.dataset.meta["crs"], "EPSG:3857")
 
-        source_img = Image(TEST_FILE)
+        img.warp("EPSG:4326", resolution=1.0)
+        self.assertEqual(1.0, img.dataset.transform.to_gdal()[1])
+
+        source_img = self.image_copy()
         source_img.warp("EPSG:3857", resolution=10)
-        target_img = Image(TEST_FILE)
+        target_img = self.image_copy()
         target_img.warp("EPSG:3857", resolution=25)
         self.assertNotEqual(source_img.dataset.transform, target_img.dataset.transform)
         source_img.warp("EPSG:3857", target_align=target_img)
@@ -360,51 +361,70 @@ class RasterTest(unittest.TestCase):
         self.assertEqual(["1", "2", "3"], self.img._lookup_bands(Platform.Sentinel2, ["Blue", "Green", "Red"]))
 
     def test_get_tiles(self):
-        for idx, each in enumerate(self.img.get_tiles(5, 5, 1)):
-            self.assertIsInstance(each, windows.Window)
-            if idx == 2578:
-                self.assertEqual(each, windows.Window(col_off=79, row_off=649, width=7, height=7))
-
-        self.assertEqual(idx, 20807)
+        tiles = list(self.img.get_tiles(5, 5, 1))
+        self.assertTrue(all(isinstance(each, windows.Window) for each in tiles))
+        self.assertEqual(tiles[2578], windows.Window(col_off=79, row_off=649, width=7, height=7))
+        self.assertEqual(len(tiles), 20808)
 
     def test_get_subset(self):
-        for idx, each in enumerate(self.img.get_tiles(5, 5, 1)):
-            if idx == 2578:
-                array, bounds = self.img.get_subset(each)
-                self.assertTrue(np.array_equal(array, np.zeros(shape=(7, 7), dtype=array.dtype)))
-                self.assertEqual(bounds, (11.903960582768779, 51.45624717410995, 11.904589403469808, 51.45687599481152))
+        # tile 2578 of get_tiles(5, 5, 1), see test_get_tiles
+        array, bounds = self.img.get_subset(windows.Window(col_off=79, row_off=649, width=7, height=7))
+        self.assertEqual(array.shape, (7, 7))
+        self.assertFalse(array.any())
+        self.assertEqual(bounds, (11.903960582768779, 51.45624717410995, 11.904589403469808, 51.45687599481152))
 
     def test_get_dask_array(self):
-        self.assertIsInstance(self.img.to_dask_array(chunk_size=(1, 10, 10)), dask.array.core.Array)
-
-    def test_write_to_file(self):
-        self.img.write_to_file(r"result.tif", np.uint16)
-        with Image("result.tif") as img2:
-            self.assertTrue(np.array_equal(img2.arr, self.img.arr))
-
-        os.remove(r"result.tif")
-
-        self.img.write_to_file(r"result.tif", "min", compress="lzw")
-        with Image("result.tif") as img2:
-            self.assertEqual(img2.arr.dtype, "uint8")
-            self.assertEqual(img2.dataset.profile["compress"], "lzw")
+        import dask.array  # only needed here, dask is slow to import
 
-        os.remove(r"result.tif")
-
-        self.img.write_to_file(r"result.tif", np.uint8, compress="packbits", kwargs={"tiled": True})
-        with Image("result.tif") as img2:
-            self.assertEqual(img2.arr.dtype, "uint8")
-            self.assertEqual(img2.dataset.profile["tiled"], True)
-
-        os.remove(r"result.tif")
+        self.assertIsInstance(self.img.to_dask_array(chunk_size=(1, 10, 10)), dask.array.core.Array)
 
-        with Image(self.img.arr, crs=self.img.dataset.crs, transform=self.img.dataset.transform) as img3:
-            img3.write_to_file(r"result.tif", np.uint16)
+    def test_get_dask_array_default_chunks(self):
+        # dummy.tif fits into a single auto chunk, so write it tiled and lower the chunk size to get several
+        with MemoryFile() as memfile:
+            self.img.write_to_file(memfile, np.int16, kwargs={"tiled": True, "blockxsize": 128, "blockysize": 128})
+            with Image(memfile) as img, dask.config.set({"array.chunk-size": "64KiB"}):
+                block_rows, block_cols = img.dataset.block_shapes[0]
+                band_chunks, row_chunks, col_chunks = img.to_dask_array().chunks
 
-        with Image("result.tif") as img4:
-            self.assertTrue(np.array_equal(img4.arr, self.img.arr))
+        self.assertEqual(band_chunks, (1,))
+        self.assertGreater(len(row_chunks), 1)
+        self.assertGreater(len(col_chunks), 1)
+        self.assertTrue(all(c % block_rows == 0 for c in row_chunks[:-1]))
+        self.assertTrue(all(c % block_cols == 0 for c in col_chunks[:-1]))
 
-        os.remove(r"result.tif")
+    def test_write_to_file(self):
+        with tempfile.TemporaryDirectory() as td:
+            result = Path(td, "result.tif")
+            self.img.write_to_file(result, np.uint16)
+            with Image(result) as img2:
+                self.assertTrue(np.array_equal(img2.arr, self.img.arr))
+
+        # the other round trips stay in memory, writing to a path is covered above
+        with MemoryFile() as memfile:
+            self.img.write_to_file(memfile, "min", compress="lzw")
+            with Image(memfile) as img2:
+                self.assertEqual(img2.arr.dtype, "uint8")
+                self.assertEqual(img2.dataset.profile["compress"], "lzw")
+
+        with MemoryFile() as memfile:
+            self.img.write_to_file(memfile, np.uint8, compress="packbits", kwargs={"tiled": True})
+            with Image(memfile) as img2:
+                self.assertEqual(img2.arr.dtype, "uint8")
+                self.assertEqual(img2.dataset.profile["tiled"], True)
+
+        with MemoryFile() as memfile:
+            with Image(self.img.arr, crs=self.img.dataset.crs, transform=self.img.dataset.transform) as img3:
+                img3.write_to_file(memfile, np.uint16)
+
+            with Image(memfile) as img4:
+                self.assertTrue(np.array_equal(img4.arr, self.img.arr))
+
+    def test_write_to_file_in_row_bands(self):
+        with mock.patch("ukis_pysat.raster._WRITE_CHUNK_BYTES", 1), MemoryFile() as memfile:
+            self.img.write_to_file(memfile, np.float32, kwargs={"tiled": True, "blockxsize": 64, "blockysize": 64})
+            with Image(memfile) as img2:
+                self.assertEqual(img2.arr.dtype, "float32")
+                self.assertTrue(np.array_equal(img2.arr, self.img.arr))
 
 
 if __name__ == "__main__":
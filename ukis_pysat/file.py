@@ -3,12 +3,33 @@
 import contextlib
 import os
 import tempfile
+import threading
 import xml.etree.ElementTree as ET
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from decimal import Decimal
+from functools import lru_cache
 from pathlib import Path
 from re import compile
-from typing import List, Union, Dict, Iterator, Tuple, Any, Pattern
+from typing import List, Union, Dict, FrozenSet, Iterable, Iterator, Tuple, Any, Pattern, Optional
+
+# values env_get treats as True, compared lower case
+_TRUE_VALUES: FrozenSet[str] = frozenset(("true", "y", "yes", "1"))
+
+# Sentinel-1, -2 & -3 scene identifiers, e.g. S1A_IW_GRDH_..., S2B_MSIL1C_... or S3A_OL_1_EFR____...
+_SENTINEL_IDENT_PATTERN: Pattern[str] = compile("^S[1-3]._+")
+
+# timestamp format used in Sentinel filenames, e.g. 20200113T074619
+_SENTINEL_TS_FORMAT: str = "%Y%m%dT%H%M%S"
+
+# Sentinel-1 polarisation code of the product class, e.g. SDV in S1A_IW_GRDH_1SDV_..., as (single, dual)
+_S1_POLARIZATIONS: Dict[str, Tuple[str, str]] = {
+    "SSV": ("VV", "VV"),
+    "SSH": ("HH", "HH"),
+    "SDV": ("VV", "VV,VH"),
+    "SDH": ("HH", "HH,HV"),
+}
 
 
 def env_get(key: str, boolean: bool = False) -> Union[str, bool]:
@@ -20,7 +41,7 @@ def env_get(key: str, boolean: bool = False) -> Union[str, bool]:
     """
     try:
         if boolean:
-            return os.environ[key].lower() in ["true", "y", "yes", "1"]
+            return os.environ[key].lower() in _TRUE_VALUES
         return os.environ[key]
     except KeyError:
         raise KeyError(f"No environment variable {key} found")
@@ -38,13 +59,14 @@ def get_sentinel_scene_from_dir(indir: Union[str, Path]) -> Iterator[Tuple[Path,
     S1M_hello_from_inside
     """
 
-    if isinstance(indir, str):
-        indir = Path(indir)
-    pattern: Pattern[str] = compile("^S[1-3]._+")
+    # scandir entries carry the file type from the directory listing, so is_dir() needs no extra stat call
+    with os.scandir(indir) as it:
+        entries: List[os.DirEntry] = list(it)
 
-    for full_path in indir.iterdir():
+    for entry in entries:
+        full_path: Path = Path(entry.path)
         ident: str = full_path.stem
-        if not pattern.match(ident):
+        if not _SENTINEL_IDENT_PATTERN.match(ident):
             continue
 
         if full_path.suffix == ".zip":
@@ -52,16 +74,52 @@ def get_sentinel_scene_from_dir(indir: Union[str, Path]) -> Iterator[Tuple[Path,
             with tempfile.TemporaryDirectory() as td:
                 os.chdir(td)
                 try:
-                    with zipfile.ZipFile(full_path) as z:
-                        z.extractall()
-                        with get_sentinel_scene_from_dir(td) as res:
-                            yield res
+                    _extract_zip(full_path, td)
+                    with get_sentinel_scene_from_dir(td) as res:
+                        yield res
                 finally:
                     os.chdir(cwd)
-        elif full_path.is_dir():
+        elif entry.is_dir():
             yield full_path, ident
 
 
+def _extract_zip(zip_path: Union[str, Path], target_dir: Union[str, Path], max_workers: Optional[int] = None) -> None:
+    """Extract all members of a zip archive, decompressing them in parallel threads. zlib releases the GIL while
+    inflating, so archives with many members like Sentinel SAFE zips are unpacked concurrently.
+
+    :param zip_path: path to zip archive
+    :param target_dir: directory to extract to
+    :param max_workers: int, number of threads, optional (default: None, see concurrent.futures.ThreadPoolExecutor)
+    """
+    with zipfile.ZipFile(zip_path) as z:
+        # largest members first, so they don't end up as the last task of the pool
+        members: List[zipfile.ZipInfo] = sorted(z.infolist(), key=lambda m: m.file_size, reverse=True)
+
+    # create the directory tree up front, zipfile would otherwise create it concurrently from several threads
+    for member in members:
+        parts = [p for p in member.filename.split("/") if p not in ("", os.path.curdir, os.path.pardir)]
+        if not member.is_dir():
+            parts = parts[:-1]
+        os.makedirs(os.path.join(target_dir, *parts), exist_ok=True)
+
+    local = threading.local()
+    handles: List[zipfile.ZipFile] = []
+
+    def extract(member: zipfile.ZipInfo) -> None:
+        # ZipFile objects must not be shared across threads, so each worker opens its own handle
+        if not hasattr(local, "z"):
+            local.z = zipfile.ZipFile(zip_path)
+            handles.append(local.z)
+        local.z.extract(member, target_dir)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(extract, members))  # re-raises the first exception of a worker
+    finally:
+        for handle in handles:
+            handle.close()
+
+
 def get_polarization_from_s1_filename(filename: str, dual: bool = False) -> str:
     """Get polarization from the filename of a Sentinel-1 scene.
     https://sentinel.esa.int/web/sentinel/user-guides/sentinel-1-sar/naming-conventions.
@@ -79,18 +137,8 @@ def get_polarization_from_s1_filename(filename: str, dual: bool = False) -> str:
     >>> get_polarization_from_s1_filename("MMM_BB_TTTR_1SDV_YYYYMMDDTHHMMSS_YYYYMMDDTHHMMSS_OOOOOO_DDDDDD_CCCC.SAFE.zip", True)
     'VV,VH'
     """
-    polarization_dict: Dict[str, str] = {
-        "SSV": "VV",
-        "SSH": "HH",
-        "SDV": "VV,VH",
-        "SDH": "HH,HV",
-    }
-
-    polarization: str = polarization_dict[filename[13:16]]
-    if not dual and "," in polarization:
-        return polarization.split(",")[0]
-    else:
-        return polarization
+    single, both = _S1_POLARIZATIONS[filename[13:16]]
+    return both if dual else single
 
 
 def get_ts_from_sentinel_filename(filename: str, start_date: bool = True, dformat: str = "%Y%m%dT%H%M%S") -> datetime:
@@ -113,18 +161,78 @@ def get_ts_from_sentinel_filename(filename: str, start_date: bool = True, dforma
     >>> get_ts_from_sentinel_filename("S2AM_MSIXXX_20200113T074619_Nxxyy_ROOO_Txxxxx_<Product Discriminator>.SAFE")
     datetime.datetime(2020, 1, 13, 7, 46, 19, tzinfo=datetime.timezone.utc)
     """
+    ts: str = _get_ts_str_from_sentinel_filename(filename, start_date)
+    if dformat == _SENTINEL_TS_FORMAT and len(ts) == 15 and ts[8] == "T" and ts.isascii():
+        date, time = ts[:8], ts[9:]
+        if date.isdigit() and time.isdigit():
+            # fast path, strptime re-parses the format on every call. Out of range values are left to strptime,
+            # so the error message stays the same
+            with contextlib.suppress(ValueError):
+                return datetime(
+                    int(date[:4]),
+                    int(date[4:6]),
+                    int(date[6:]),
+                    int(time[:2]),
+                    int(time[2:4]),
+                    int(time[4:]),
+                    0,
+                    timezone.utc,
+                )
+    return datetime.strptime(ts, dformat).replace(tzinfo=timezone.utc)
+
+
+def get_ts_from_sentinel_filenames(filenames: Iterable[str], start_date: bool = True) -> Any:
+    """Get timestamps from the filenames of many Sentinel scenes at once, according to naming conventions.
+    Currently works for S1, S2 & S3 and timestamps formatted as %Y%m%dT%H%M%S.
+
+    :param filenames: top-level SENTINEL product folder or file names
+    :param start_date: boolean (default: True), False is Stop Date, optional
+    :return: numpy array of datetime64[s] in UTC
+
+    >>> get_ts_from_sentinel_filenames(["S2AM_MSIXXX_20200113T074619_Nxxyy_ROOO_Txxxxx_<Product Discriminator>.SAFE"])
+    array(['2020-01-13T07:46:19'], dtype='datetime64[s]')
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("get_ts_from_sentinel_filenames requires optional dependency NumPy.")
+
+    ts = np.array([_get_ts_str_from_sentinel_filename(f, start_date) for f in filenames], dtype="S")
+    if ts.size == 0:
+        return np.array([], dtype="datetime64[s]")
+
+    # shorter timestamps are padded with zero bytes and fail the digit check
+    chars = ts.view(np.uint8).reshape(ts.size, -1).astype(np.int64)
+    if chars.shape[1] != 15:
+        raise ValueError("Timestamps do not match format '%Y%m%dT%H%M%S'")
+    digits = np.delete(chars, 8, axis=1) - ord("0")
+    if (chars[:, 8] != ord("T")).any() or ((digits < 0) | (digits > 9)).any():
+        raise ValueError("Timestamps do not match format '%Y%m%dT%H%M%S'")
+
+    def number(start: int, stop: int) -> Any:
+        return digits[:, start:stop] @ 10 ** np.arange(stop - start - 1, -1, -1)
+
+    year, month, day = number(0, 4), number(4, 6), number(6, 8)
+    hour, minute, second = number(8, 10), number(10, 12), number(12, 14)
+    if ((year < 1) | (month < 1) | (month > 12) | (day < 1) | (hour > 23) | (minute > 59) | (second > 59)).any():
+        raise ValueError("Timestamps do not match format '%Y%m%dT%H%M%S'")
+
+    months = (year - 1970) * 12 + month - 1
+    days = months.astype("datetime64[M]").astype("datetime64[D]") + (day - 1)
+    if (days.astype("datetime64[M]").astype(np.int64) != months).any():
+        raise ValueError("Timestamps contain days out of range for month")
+    return days.astype("datetime64[s]") + (hour * 3600 + minute * 60 + second)
+
+
+def _get_ts_str_from_sentinel_filename(filename: str, start_date: bool) -> str:
+    """Cut the timestamp out of the filename of a Sentinel scene, see get_ts_from_sentinel_filename."""
+    # only split as far as needed, the rest of the name is irrelevant for the timestamp
     if filename.startswith("S2"):
-        return datetime.strptime(filename.split("_")[2], dformat).replace(tzinfo=timezone.utc)
+        return filename.split("_", 3)[2]
     elif filename.startswith("S1"):
-        if start_date:
-            return datetime.strptime(filename.split("_")[4], dformat).replace(tzinfo=timezone.utc)
-        else:
-            return datetime.strptime(filename.split("_")[5], dformat).replace(tzinfo=timezone.utc)
+        return filename.split("_", 6)[4 if start_date else 5]
     else:
-        if start_date:
-            return datetime.strptime(filename[16:31], dformat).replace(tzinfo=timezone.utc)
-        else:
-            return datetime.strptime(filename[32:47], dformat).replace(tzinfo=timezone.utc)
+        return filename[16:31] if start_date else filename[32:47]
 
 
 def get_sat_ts_from_datetime(dt: datetime, dformat: str = "%Y%m%dT%H%M%S") -> str:
@@ -134,12 +242,60 @@ def get_sat_ts_from_datetime(dt: datetime, dformat: str = "%Y%m%dT%H%M%S") -> st
     :param dformat: : str, (default: %Y%m%dT%H%M%S)
     :return: ESA timestamp as string
 
-    >>> get_sat_ts_from_datetime(datetime(2020, 1, 13, 7, 46, 19, tzinfo=timezone.utc)
+    >>> get_sat_ts_from_datetime(datetime(2020, 1, 13, 7, 46, 19, tzinfo=timezone.utc))
     '20200113T074619'
     """
+    if dformat == _SENTINEL_TS_FORMAT:
+        return f"{dt.year:04d}{dt.month:02d}{dt.day:02d}T{dt.hour:02d}{dt.minute:02d}{dt.second:02d}"
     return dt.strftime(dformat)
 
 
+def _find_first_in_section(
+    xml_path: Union[str, Path, os.DirEntry], section: str, tag: str
+) -> Optional[Tuple[Optional[str], Dict[str, str]]]:
+    """Find the first element with tag inside an element named section, like root.iter(section) followed by
+    elem.iter() would. Results are cached per file, a modified file is parsed again.
+
+    :param xml_path: path to xml file or os.DirEntry from a directory scan, whose cached stat is reused
+    :param section: tag of the enclosing element, e.g. 'metadataSection'
+    :param tag: tag of the element to find, including namespace, e.g. '{http://www.opengis.net/gml}coordinates'
+    :return: text and attributes of the element or None if it was not found
+    """
+    if isinstance(xml_path, os.DirEntry):
+        path: str = os.path.abspath(xml_path.path)
+        st: os.stat_result = xml_path.stat()
+    else:
+        path = os.path.abspath(xml_path)
+        st = os.stat(path)
+    found = _cached_find_first_in_section(path, st.st_mtime_ns, st.st_size, section, tag)
+    if found is None:
+        return None
+    text, attrib = found
+    return text, dict(attrib)
+
+
+@lru_cache(maxsize=128)
+def _cached_find_first_in_section(
+    path: str, mtime_ns: int, size: int, section: str, tag: str
+) -> Optional[Tuple[Optional[str], Tuple[Tuple[str, str], ...]]]:
+    """Parse the file incrementally and only up to the end of the found element. mtime_ns and size are only part of
+    the cache key. Only immutable values are cached, so that callers cannot alter the results of later lookups.
+    """
+    open_sections: int = 0
+    match: Optional[ET.Element] = None
+    with open(path, "rb") as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if match is not None:
+                # attributes are available on start, but text only once the element has ended
+                if elem is match and event == "end":
+                    return match.text, tuple(match.attrib.items())
+            elif elem.tag == section:
+                open_sections += 1 if event == "start" else -1
+            elif open_sections and event == "start" and elem.tag == tag:
+                match = elem
+    return None
+
+
 def get_footprint_from_manifest(xml_path: Union[str, Path]) -> Any:
     """Return a shapely polygon with footprint of scene, tested for Sentinel-1.
 
@@ -153,20 +309,47 @@ def get_footprint_from_manifest(xml_path: Union[str, Path]) -> Any:
         from shapely.geometry import Polygon  # type: ignore
     except ImportError:
         raise ImportError("get_footprint_from_manifest requires optional dependency Shapely.")
-    tree: ET.ElementTree = ET.parse(xml_path)
-    root: ET.Element = tree.getroot()
-    for elem in root.iter("metadataSection"):
-        for child in elem.iter():
-            if child.tag == "{http://www.opengis.net/gml}coordinates":
-                coords = child.text
-                if coords is None:
-                    raise AssertionError("Footprint not found")
-                vertices: List = []
-                for i in coords.split(" "):
-                    c = i.split(",")
-                    vertices.append((float(c[1]), float(c[0])))
-                return Polygon(vertices)
-    raise KeyError("Footprint not found")
+    return Polygon(_get_footprint_vertices_from_manifest(xml_path))
+
+
+def get_footprint_wkt_from_manifest(xml_path: Union[str, Path]) -> str:
+    """Return the footprint of scene as WKT polygon, without requiring Shapely. Tested for Sentinel-1.
+
+    Coordinates are written positionally with the shortest digits that read back as the same float, which is not
+    always the output of Shapely's ``wkt``.
+
+    :param xml_path: path to manifest.safe
+    :return: WKT string
+
+    >>> get_footprint_wkt_from_manifest(Path(__file__).parents[1] / "tests/testfiles/manifest.safe")
+    'POLYGON ((149.766922 -24.439564, 153.728622 -23.51771, 154.075058 -24.737713, 150.077042 -25.668921, 149.766922 -24.439564))'
+    """
+    vertices: List[Tuple[float, float]] = _get_footprint_vertices_from_manifest(xml_path)
+    if vertices[0] != vertices[-1]:
+        vertices.append(vertices[0])
+
+    def number(value: float) -> str:
+        # shortest round-trip representation in positional notation, without trailing zeros and negative zero
+        s = format(Decimal(repr(value)), "f")
+        s = s.rstrip("0").rstrip(".") if "." in s else s
+        return "0" if s == "-0" else s
+
+    return f"POLYGON (({', '.join(f'{number(x)} {number(y)}' for x, y in vertices)}))"
+
+
+def _get_footprint_vertices_from_manifest(xml_path: Union[str, Path]) -> List[Tuple[float, float]]:
+    """Read the footprint of scene from manifest file as list of (lon, lat) vertices."""
+    found = _find_first_in_section(xml_path, "metadataSection", "{http://www.opengis.net/gml}coordinates")
+    if found is None:
+        raise KeyError("Footprint not found")
+    coords, _ = found
+    if coords is None:
+        raise AssertionError("Footprint not found")
+    vertices: List[Tuple[float, float]] = []
+    for i in coords.split(" "):
+        c = i.split(",")
+        vertices.append((float(c[1]), float(c[0])))
+    return vertices
 
 
 def get_origin_from_manifest(xml_path: Union[str, Path]) -> str:
@@ -178,13 +361,11 @@ def get_origin_from_manifest(xml_path: Union[str, Path]) -> str:
     >>> get_origin_from_manifest(Path(__file__).parents[1] / "tests/testfiles/manifest.safe")
     'United Kingdom'
     """
-    tree: ET.ElementTree = ET.parse(xml_path)
-    root: ET.Element = tree.getroot()
-    for elem in root.iter("metadataSection"):
-        for child in elem.iter():
-            if child.tag == "{http://www.esa.int/safe/sentinel-1.0}facility":
-                return child.attrib["country"]
-    raise KeyError("Country of origin not found.")
+    found = _find_first_in_section(xml_path, "metadataSection", "{http://www.esa.int/safe/sentinel-1.0}facility")
+    if found is None:
+        raise KeyError("Country of origin not found.")
+    _, attrib = found
+    return attrib["country"]
 
 
 def get_ipf_from_manifest(xml_path: Union[str, Path]) -> float:
@@ -196,13 +377,11 @@ def get_ipf_from_manifest(xml_path: Union[str, Path]) -> float:
     >>> get_ipf_from_manifest(Path(__file__).parents[1] / "tests/testfiles/manifest.safe")
     2.82
     """
-    tree: ET.ElementTree = ET.parse(xml_path)
-    root: ET.Element = tree.getroot()
-    for elem in root.iter("metadataSection"):
-        for child in elem.iter():
-            if child.tag == "{http://www.esa.int/safe/sentinel-1.0}software":
-                return float(child.attrib["version"])
-    raise KeyError("IPF Version not found.")
+    found = _find_first_in_section(xml_path, "metadataSection", "{http://www.esa.int/safe/sentinel-1.0}software")
+    if found is None:
+        raise KeyError("IPF Version not found.")
+    _, attrib = found
+    return float(attrib["version"])
 
 
 def get_pixel_spacing(scenedir: Union[str, Path], polarization: str = "HH") -> Tuple[float, float]:
@@ -215,21 +394,19 @@ def get_pixel_spacing(scenedir: Union[str, Path], polarization: str = "HH") -> T
     >>> get_pixel_spacing(Path(__file__).parents[1] / "tests/testfiles")
     (40.0, 0.0003593261136478086)
     """
-    if isinstance(scenedir, str):
-        scenedir = Path(scenedir)
-    for path_to_file in scenedir.joinpath("annotation").iterdir():
-        if path_to_file.suffix == ".xml" and path_to_file.name.split("-")[3] == polarization.lower():
-            tree: ET.ElementTree = ET.parse(path_to_file)
-            root: ET.Element = tree.getroot()
-            for elem in root.iter("imageInformation"):
-                for child in elem.iter():
-                    if child.tag == "rangePixelSpacing":
-                        if child.text is None:
-                            raise AssertionError("Pixel Spacing not found.")
-                        pixel_spacing_meter = float(child.text)
-                        pixel_spacing_degree = (pixel_spacing_meter / 10.0) * 8.983152841195215e-5
-
-                        return pixel_spacing_meter, pixel_spacing_degree
+    with os.scandir(os.path.join(scenedir, "annotation")) as it:
+        entries: List[os.DirEntry] = list(it)
+    for entry in entries:
+        if entry.name.endswith(".xml") and entry.name.split("-")[3] == polarization.lower():
+            found = _find_first_in_section(entry, "imageInformation", "rangePixelSpacing")
+            if found is not None:
+                text, _ = found
+                if text is None:
+                    raise AssertionError("Pixel Spacing not found.")
+                pixel_spacing_meter = float(text)
+                pixel_spacing_degree = (pixel_spacing_meter / 10.0) * 8.983152841195215e-5
+
+                return pixel_spacing_meter, pixel_spacing_degree
     raise KeyError("Pixel Spacing not found.")
 
 
@@ -249,7 +426,8 @@ def get_proj_string(footprint: Any) -> str:
         raise ImportError("get_proj_string requires optional dependency utm.")
     # get UTM coordinates from Lat/lon pair of centroid of footprint
     # coords contains UTM coordinates, UTM zone & UTM letter, e.g. (675539.8854425425, 4478111.711657521, 34, 'T')
-    coords: Tuple = utm.from_latlon(footprint.centroid.y, footprint.centroid.x)
+    centroid = footprint.centroid  # computed by GEOS on every attribute access, so only once
+    coords: Tuple = utm.from_latlon(centroid.y, centroid.x)
 
     return f"+proj=utm +zone={coords[2]}{coords[3]}, +ellps=WGS84 +datum=WGS84 +units=m +no_defs"
 
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import math
-from itertools import product
+from functools import lru_cache
 from pathlib import Path
 
 from ukis_pysat.members import Platform
@@ -10,6 +10,7 @@ try:
     import xmltodict
     import numpy as np
     import rasterio
+    import rasterio.crs
     import rasterio.dtypes
     import rasterio.mask
     import rasterio.plot
@@ -27,12 +28,79 @@ except ImportError as e:
     raise ImportError(str(e) + "\n\n" + msg)
 
 
+# write_to_file converts and writes the array in row bands of about this size
+_WRITE_CHUNK_BYTES = 64 * 1024 * 1024
+
+# band names of the platforms by lower case wavelength name, see Image._lookup_bands
+_WAVE_BANDS = {
+    Platform.Landsat5: {
+        "blue": "1",
+        "green": "2",
+        "red": "3",
+        "nir": "4",
+        "swir1": "5",
+        "tirs": "6",
+        "swir2": "7",
+    },
+    Platform.Landsat7: {
+        "blue": "1",
+        "green": "2",
+        "red": "3",
+        "nir": "4",
+        "swir1": "5",
+        "tirs1": "6_VCID_1",
+        "tirs2": "6_VCID_2",
+        "swir2": "7",
+        "pan": "8",
+    },
+    Platform.Landsat8: {
+        "aerosol": "1",
+        "blue": "2",
+        "green": "3",
+        "red": "4",
+        "nir": "5",
+        "swir1": "6",
+        "swir2": "7",
+        "pan": "8",
+        "cirrus": "9",
+        "tirs1": "10",
+        "tirs2": "11",
+    },
+    Platform.Sentinel2: {
+        "aerosol": "0",
+        "blue": "1",
+        "green": "2",
+        "red": "3",
+        "rededge1": "4",
+        "rededge2": "5",
+        "rededge3": "6",
+        "nir": "7",
+        "rededge4": "8",
+        "watervapor": "9",
+        "cirrus": "10",
+        "swir1": "11",
+        "swir2": "12",
+    },
+}
+
+
+@lru_cache(maxsize=32)
+def _crs_from_string(crs):
+    """Parses a CRS string like 'EPSG:3857' once, so repeated warps to the same CRS reuse the rasterio CRS object.
+
+    :param crs: str, anything rasterio.crs.CRS.from_user_input accepts as string
+    :return: rasterio.crs.CRS
+    """
+    return rasterio.crs.CRS.from_user_input(crs)
+
+
 class Image:
     da_arr = None
 
     def __init__(self, data, dimorder="first", crs=None, transform=None, nodata=None):
         """
-        :param data: rasterio.io.DatasetReader or path to raster or np.ndarray of shape (bands, rows, columns)
+        :param data: rasterio.io.DatasetReader, rasterio.io.MemoryFile or path to raster or np.ndarray of shape (bands,
+            rows, columns)
         :param dimorder: Order of channels or bands 'first' or 'last' (default: 'first')
         :param crs: Coordinate reference system used when creating form array. If 'data' is np.ndarray this is required (default: None)
         :param transform: Affine transformation mapping the pixel space to geographic space. If 'data' is np.ndarray this is required (default: None)
@@ -52,6 +120,10 @@ class Image:
             self.dataset = rasterio.open(data)
             self.__arr = self.dataset.read()
 
+        elif isinstance(data, MemoryFile):
+            self.dataset = data.open()
+            self.__arr = self.dataset.read()
+
         elif isinstance(data, np.ndarray):
             if crs is None:
                 raise TypeError("if dataset is of type np.ndarray crs must not be None")
@@ -68,7 +140,9 @@ class Image:
             self.dataset = None
             self.__update_dataset(crs, transform, nodata=nodata)
         else:
-            raise TypeError("dataset must be of type rasterio.io.DatasetReader, str or np.ndarray")
+            raise TypeError(
+                "dataset must be of type rasterio.io.DatasetReader, rasterio.io.MemoryFile, str or np.ndarray"
+            )
 
     def __enter__(self):
         return self
@@ -107,7 +181,27 @@ class Image:
         :param nodata: nodata value, optional (default: 0)
         :return: tuple with valid data bounds
         """
-        valid_data_window = rasterio.windows.get_data_window(self.__arr, nodata=nodata)
+        if nodata is None:
+            # no value to compare against, rasterio falls back to the mask of a masked array or the full extent
+            valid_data_window = rasterio.windows.get_data_window(self.__arr, nodata=nodata)
+            return rasterio.windows.bounds(valid_data_window, self.dataset.transform)
+
+        if np.isnan(nodata):
+            valid = ~np.isnan(self.__arr)
+        else:
+            valid = self.__arr != nodata
+        valid = valid.any(axis=0)
+
+        # reduce to one flag per row and column instead of collecting coordinates of all valid pixels
+        valid_rows = valid.any(axis=1)
+        valid_cols = valid.any(axis=0)
+        if valid_rows.any():
+            row_start, row_stop = valid_rows.argmax(), valid_rows.size - valid_rows[::-1].argmax()
+            col_start, col_stop = valid_cols.argmax(), valid_cols.size - valid_cols[::-1].argmax()
+        else:
+            row_start = row_stop = col_start = col_stop = 0
+
+        valid_data_window = rasterio.windows.Window.from_slices((row_start, row_stop), (col_start, col_stop))
         return rasterio.windows.bounds(valid_data_window, self.dataset.transform)
 
     def mask(self, bbox, crop=True, fill=False, mode="constant", constant_values=0):
@@ -232,6 +326,10 @@ class Image:
         :param target_align: raster to which to align resolution, extent and gridspacing, optional (Image).
         :param nodata: nodata value of source, int or float, optional.
         """
+        if isinstance(dst_crs, str):
+            # parsed once here instead of in calculate_default_transform, reproject and __update_dataset each
+            dst_crs = _crs_from_string(dst_crs)
+
         if target_align:
             transform = target_align.dataset.transform
             width = target_align.dataset.width
@@ -332,9 +430,11 @@ class Image:
 
                 metadata = mtl[mtl_group_main]
                 sun_elevation = metadata["IMAGE_ATTRIBUTES"]["SUN_ELEVATION"]
-                toa = []
+                bands = self._lookup_bands(platform, wavelengths)
 
-                for idx, b in enumerate(self._lookup_bands(platform, wavelengths)):
+                # rio_toa returns float32 bands, write them into the result instead of stacking copies of them
+                toa = np.empty((len(bands),) + self.__arr.shape[1:], dtype=np.float32)
+                for idx, b in enumerate(bands):
                     if (platform == Platform.Landsat8 and b in ["10", "11"]) or (
                         platform != Platform.Landsat8 and b.startswith("6")
                     ):
@@ -358,14 +458,12 @@ class Image:
                         additive_rescaling_factors = metadata[mtl_group_radiometric_rescaling][f"RADIANCE_ADD_BAND_{b}"]
 
                         # rescale thermal bands
-                        toa.append(
-                            brightness_temp.brightness_temp(
-                                self.__arr[idx, :, :],
-                                ML=multiplicative_rescaling_factors,
-                                AL=additive_rescaling_factors,
-                                K1=thermal_conversion_constant1,
-                                K2=thermal_conversion_constant2,
-                            )
+                        toa[idx] = brightness_temp.brightness_temp(
+                            self.__arr[idx, :, :],
+                            ML=multiplicative_rescaling_factors,
+                            AL=additive_rescaling_factors,
+                            K1=thermal_conversion_constant1,
+                            K2=thermal_conversion_constant2,
                         )
                         continue
 
@@ -374,16 +472,14 @@ class Image:
                         f"REFLECTANCE_MULT_BAND_{b}"
                     ]
                     additive_rescaling_factors = metadata[mtl_group_radiometric_rescaling][f"REFLECTANCE_ADD_BAND_{b}"]
-                    toa.append(
-                        reflectance.reflectance(
-                            self.__arr[idx, :, :],
-                            MR=multiplicative_rescaling_factors,
-                            AR=additive_rescaling_factors,
-                            E=sun_elevation,
-                        )
+                    toa[idx] = reflectance.reflectance(
+                        self.__arr[idx, :, :],
+                        MR=multiplicative_rescaling_factors,
+                        AR=additive_rescaling_factors,
+                        E=sun_elevation,
                     )
 
-                self.__arr = np.array(np.stack(toa, axis=0))
+                self.__arr = toa
         elif platform == Platform.Sentinel2:
             if mtd_file is None:
                 raise AttributeError(f"'mtd_file' has to be set if platform is {platform}.")
@@ -399,20 +495,25 @@ class Image:
                     "Product_Image_Characteristics"
                 ]
                 quantification_value = float(product_image_characteristics["QUANTIFICATION_VALUE"]["#text"])
-                toa = []
+                bands = self._lookup_bands(platform=Platform.Sentinel2, wavelengths=wavelengths)
 
                 if pb_baseline >= 4.0:
-                    radio_offsets = product_image_characteristics["Radiometric_Offset_List"]["RADIO_ADD_OFFSET"]
-                    for idx, b in enumerate(self._lookup_bands(platform=Platform.Sentinel2, wavelengths=wavelengths)):
-                        radio_offset = float([i for i in radio_offsets if i["@band_id"] == b][0]["#text"])
-
-                        # rescale reflectance bands
-                        toa.append((self.__arr[idx, :, :].astype(np.float32) + radio_offset) / quantification_value)
+                    radio_offsets = {
+                        i["@band_id"]: float(i["#text"])
+                        for i in product_image_characteristics["Radiometric_Offset_List"]["RADIO_ADD_OFFSET"]
+                    }
                 else:
-                    for idx, _ in enumerate(self._lookup_bands(platform=Platform.Sentinel2, wavelengths=wavelengths)):
-                        toa.append(self.__arr[idx, :, :].astype(np.float32) / quantification_value)
+                    radio_offsets = None
+
+                # rescale reflectance bands in place, without temporaries per band and copies when stacking
+                toa = np.empty((len(bands),) + self.__arr.shape[1:], dtype=np.float32)
+                for idx, b in enumerate(bands):
+                    toa[idx] = self.__arr[idx, :, :]
+                    if radio_offsets is not None:
+                        toa[idx] += radio_offsets[b]
+                    toa[idx] /= quantification_value
 
-                self.__arr = np.array(np.stack(toa, axis=0))
+                self.__arr = toa
         else:
             raise AttributeError(
                 f"Cannot convert dn2toa. Platform {platform} not supported [Landsat-5, Landsat-7, Landsat-8, "
@@ -429,58 +530,7 @@ class Image:
         :param wavelengths: list like ["Blue", "Green", "Red"]
         :return: list of bands like ["1", "2", "3"]
         """
-        wave_bands = {
-            Platform.Landsat5: {
-                "blue": "1",
-                "green": "2",
-                "red": "3",
-                "nir": "4",
-                "swir1": "5",
-                "tirs": "6",
-                "swir2": "7",
-            },
-            Platform.Landsat7: {
-                "blue": "1",
-                "green": "2",
-                "red": "3",
-                "nir": "4",
-                "swir1": "5",
-                "tirs1": "6_VCID_1",
-                "tirs2": "6_VCID_2",
-                "swir2": "7",
-                "pan": "8",
-            },
-            Platform.Landsat8: {
-                "aerosol": "1",
-                "blue": "2",
-                "green": "3",
-                "red": "4",
-                "nir": "5",
-                "swir1": "6",
-                "swir2": "7",
-                "pan": "8",
-                "cirrus": "9",
-                "tirs1": "10",
-                "tirs2": "11",
-            },
-            Platform.Sentinel2: {
-                "aerosol": "0",
-                "blue": "1",
-                "green": "2",
-                "red": "3",
-                "rededge1": "4",
-                "rededge2": "5",
-                "rededge3": "6",
-                "nir": "7",
-                "rededge4": "8",
-                "watervapor": "9",
-                "cirrus": "10",
-                "swir1": "11",
-                "swir2": "12",
-            },
-        }
-
-        return [wave_bands[platform][wavelength.lower()] for wavelength in wavelengths]
+        return [_WAVE_BANDS[platform][wavelength.lower()] for wavelength in wavelengths]
 
     def get_tiles(self, width=256, height=256, overlap=0):
         """Calculates rasterio.windows.Window, idea from https://stackoverflow.com/a/54525931
@@ -492,17 +542,23 @@ class Image:
         """
         rows = self.__arr.shape[-2]
         cols = self.__arr.shape[-1]
-        offsets = product(range(0, cols, width), range(0, rows, height))
-        bounding_window = rasterio.windows.Window(col_off=0, row_off=0, width=cols, height=rows)
-        for col_off, row_off in offsets:
-            yield rasterio.windows.Window(
-                col_off=col_off - overlap,
-                row_off=row_off - overlap,
-                width=width + 2 * overlap,
-                height=height + 2 * overlap,
-            ).intersection(
-                bounding_window
-            )  # clip off window parts not in original array
+        # column-major offsets, same order as itertools.product(col_offs, row_offs)
+        col_offs, row_offs = np.meshgrid(np.arange(0, cols, width), np.arange(0, rows, height), indexing="ij")
+        col_offs, row_offs = col_offs.ravel(), row_offs.ravel()
+
+        # clip off window parts not in original array
+        col_starts = np.maximum(col_offs - overlap, 0)
+        row_starts = np.maximum(row_offs - overlap, 0)
+        col_stops = np.minimum(col_offs + width + overlap, cols)
+        row_stops = np.minimum(row_offs + height + overlap, rows)
+
+        for col_off, row_off, w, h in zip(
+            col_starts.tolist(),
+            row_starts.tolist(),
+            (col_stops - col_starts).tolist(),
+            (row_stops - row_starts).tolist(),
+        ):
+            yield rasterio.windows.Window(col_off=col_off, row_off=row_off, width=w, height=h)
 
     def get_subset(self, tile, band=0):
         """Get slice of array.
@@ -518,10 +574,11 @@ class Image:
             bounds,
         )  # Shape of array is announced with (bands, height, width)
 
-    def to_dask_array(self, chunk_size=(1, 6000, 6000)):
+    def to_dask_array(self, chunk_size=None):
         """transforms numpy to dask array
 
-        :param chunk_size: tuple, size of chunk, optional (default: (1, 6000, 6000))
+        :param chunk_size: tuple, size of chunk, optional (default: None, one band per chunk and rows and columns
+            sized automatically as multiples of the dataset's block shape)
         :return: dask array
         """
         try:
@@ -529,6 +586,14 @@ class Image:
         except ImportError:
             raise ImportError("to_dask_array requires optional dependency dask[array].")
 
+        if chunk_size is None:
+            chunk_size = da.core.normalize_chunks(
+                (1, "auto", "auto"),
+                self.__arr.shape,
+                dtype=self.__arr.dtype,
+                previous_chunks=(1,) + self.dataset.block_shapes[0],
+            )
+
         self.da_arr = da.from_array(self.__arr, chunks=chunk_size)
         return self.da_arr
 
@@ -543,7 +608,7 @@ class Image:
     ):
         """
         Write a dataset to file.
-        :param path_to_file: str, path to new file
+        :param path_to_file: str, path to new file or rasterio.io.MemoryFile to write to
         :param dtype: datatype, like np.uint16, 'float32' or 'min' to use the minimum type to represent values
 
         :param driver: str, optional (default: 'GTiff')
@@ -576,8 +641,20 @@ class Image:
         if kwargs:
             profile.update(**kwargs)
 
-        with rasterio.open(path_to_file, "w", **profile) as dst:
-            dst.write(self.__arr.astype(dtype))
+        if isinstance(path_to_file, MemoryFile):
+            dst = path_to_file.open(**profile)
+        else:
+            dst = rasterio.open(path_to_file, "w", **profile)
+
+        with dst:
+            # row bands aligned to the block height, so only one band at a time is converted to dtype
+            bands, height, width = self.__arr.shape
+            block_height = dst.block_shapes[0][0]
+            row_bytes = bands * width * np.dtype(dtype).itemsize
+            rows = max(block_height, _WRITE_CHUNK_BYTES // row_bytes // block_height * block_height)
+            for row_off in range(0, height, rows):
+                window = rasterio.windows.Window(0, row_off, width, min(rows, height - row_off))
+                dst.write(self.__arr[:, row_off : row_off + rows].astype(dtype, copy=False), window=window)
 
     def close(self):
         """closes Image"""